@@ -1,10 +1,12 @@
 import json
 import logging
 import os
+import threading
 import time
 from typing import Any
 
-from flask import Flask, Response, jsonify, render_template, request
+import orjson
+from flask import Flask, Response, render_template, request
 
 from services.db import Database
 from services.fetcher import StreamFetcher
@@ -18,16 +20,24 @@ _log = logging.getLogger(__name__)
 def _parse_csv(value: str | None) -> list[str]:
     if not value:
         return []
-    return [v.strip() for v in value.split(",") if v.strip()]
+    # C-level strip/filter; runs on every /api/streams and /api/sse request.
+    return list(filter(None, map(str.strip, value.split(","))))
+
+
+def _json_response(obj: Any) -> Response:
+    # orjson encodes straight to bytes, several times faster than stdlib json
+    # for the deeply nested /api/streams payloads.
+    return Response(orjson.dumps(obj), mimetype="application/json")
 
 
 def _parse_int(value: str | None) -> int | None:
-    if value is None or value == "":
+    # Explicit digit check instead of try/except: most requests omit these
+    # params entirely, and raising ValueError is the expensive path.
+    if not value:
         return None
-    try:
+    if value.isdigit() or (value[0] == "-" and value[1:].isdigit()):
         return int(value)
-    except ValueError:
-        return None
+    return None
 
 
 def create_app() -> Flask:
@@ -45,15 +55,39 @@ def create_app() -> Flask:
     )
 
     db = Database(cfg.database_path)
-    twitch = TwitchClient(cfg.twitch_client_id, cfg.twitch_client_secret)
+    twitch = TwitchClient(
+        cfg.twitch_client_id,
+        cfg.twitch_client_secret,
+        token_cache_path=os.path.join(
+            os.path.dirname(cfg.database_path) or ".", ".twitch_token.json"
+        ),
+    )
     hub = SseHub()
+
+    # /api/streams response cache. Data only changes when the fetcher writes,
+    # so serve the serialized bytes until then (or until the TTL lapses).
+    streams_cache: dict[tuple, tuple[float, bytes]] = {}
+    streams_cache_lock = threading.Lock()
+    streams_cache_ttl = cfg.fetch_interval_seconds
+    STREAMS_CACHE_MAX = 512
+
+    def _evict_cached_streams(game_id: str) -> None:
+        with streams_cache_lock:
+            stale = [k for k in streams_cache if game_id in k[0]]
+            for k in stale:
+                streams_cache.pop(k, None)
+
+    def _on_game_updated(game_id: str) -> None:
+        _evict_cached_streams(game_id)
+        hub.publish_game_updated(game_id)
+
     fetcher = StreamFetcher(
         db=db,
         twitch=twitch,
         fetch_interval_seconds=cfg.fetch_interval_seconds,
         max_streams_per_game=cfg.max_streams_per_game,
         languages=cfg.languages,
-        on_game_updated=hub.publish_game_updated,
+        on_game_updated=_on_game_updated,
     )
     fetcher.start()
 
@@ -72,11 +106,11 @@ def create_app() -> Flask:
     def api_search_games() -> Response:
         q = (request.args.get("q") or "").strip()
         if not q:
-            return jsonify({"games": []})
+            return _json_response({"games": []})
         games = twitch.search_games(q, first=20)
         if games:
             db.upsert_games(games)
-        return jsonify({"games": games})
+        return _json_response({"games": games})
 
     @app.post("/api/touch_tracked")
     def api_touch_tracked() -> Response:
@@ -84,14 +118,14 @@ def create_app() -> Flask:
         game_ids = [str(x) for x in (payload.get("game_ids") or []) if str(x).strip()]
         game_ids = list(dict.fromkeys(game_ids))  # stable dedupe
         if not game_ids:
-            return jsonify({"ok": True})
+            return _json_response({"ok": True})
 
         # ensure game rows exist
         games = twitch.get_games(game_ids)
         if games:
             db.upsert_games(games)
         db.touch_tracked_games(game_ids)
-        return jsonify({"ok": True})
+        return _json_response({"ok": True})
 
     @app.get("/api/streams")
     def api_streams() -> Response:
@@ -112,6 +146,21 @@ def create_app() -> Flask:
         if game_ids:
             db.touch_tracked_games(game_ids)
 
+        key = (
+            tuple(game_ids),
+            require_broadcaster_type,
+            min_viewers,
+            max_viewers,
+            min_followers,
+            max_followers,
+            tuple(sorted(ignored)),
+        )
+        now = time.time()
+        with streams_cache_lock:
+            cached = streams_cache.get(key)
+            if cached and cached[0] > now:
+                return Response(cached[1], mimetype="application/json")
+
         data = db.query_streams(
             game_ids=game_ids,
             require_broadcaster_type=require_broadcaster_type,
@@ -134,7 +183,14 @@ def create_app() -> Flask:
                 min_followers,
                 max_followers,
             )
-        return jsonify(data)
+
+        body = orjson.dumps(data)
+        with streams_cache_lock:
+            if len(streams_cache) >= STREAMS_CACHE_MAX:
+                # Drop the entry closest to expiry to stay bounded.
+                streams_cache.pop(min(streams_cache, key=lambda k: streams_cache[k][0]), None)
+            streams_cache[key] = (now + streams_cache_ttl, body)
+        return Response(body, mimetype="application/json")
 
     @app.get("/api/sse")
     def api_sse() -> Response:
@@ -144,18 +200,17 @@ def create_app() -> Flask:
         def gen():
             try:
                 # initial hello
-                yield 'event: hello\ndata: {"ok": true}\n\n'
-                last_ping = time.time()
-                while True:
-                    try:
-                        msg = client.q.get(timeout=15)
-                        yield msg
-                    except Exception:
-                        # keepalive
-                        now = time.time()
-                        if now - last_ping >= 15:
-                            last_ping = now
-                            yield "event: ping\ndata: {}\n\n"
+                yield b'event: hello\ndata: {"ok": true}\n\n'
+                # Keepalives come from the hub's heartbeat thread, so just
+                # block until there's something to send.
+                while not client.closed:
+                    client.event.wait()
+                    client.event.clear()
+                    while True:
+                        try:
+                            yield client.buf.popleft()
+                        except IndexError:
+                            break
             finally:
                 hub.unsubscribe(client.id)
 
@@ -1,3 +1,4 @@
+import json
 import os
 import sqlite3
 import threading
@@ -7,6 +8,41 @@ from typing import Any, Iterable
 
 TTL_SECONDS = 7 * 24 * 60 * 60
 
+# Fixed-shape query so SQLite compiles it once and the statement cache hits
+# on every request. Variable-length lists (game ids, ignored users) come in
+# as JSON arrays via json_each() instead of per-call IN (?,?,...) expansion,
+# and optional filters collapse to "param IS NULL OR ..." checks.
+#
+# Driving the outer query from games with a LEFT JOIN keeps one row per
+# requested game even when every stream is filtered out, so empty game
+# cards fall out of the same SELECT instead of needing a second query.
+_QUERY_STREAMS_SQL = """
+SELECT
+  g.id AS game_id, g.name AS game_name, g.box_art_url AS game_box_art_url,
+  t.id AS stream_id, t.user_id, t.user_name, t.title, t.viewer_count, t.started_at, t.language,
+  t.thumbnail_url, t.broadcaster_type, t.follower_count
+FROM games g
+LEFT JOIN (
+  SELECT
+    s.game_id, s.id, s.user_id, s.user_name, s.title, s.viewer_count, s.started_at, s.language,
+    s.thumbnail_url,
+    COALESCE(p.broadcaster_type, '') AS broadcaster_type, p.follower_count
+  FROM streams s
+  LEFT JOIN streamer_profiles p ON p.user_id = s.user_id
+  WHERE s.game_id IN (SELECT value FROM json_each(:game_ids))
+    AND s.is_live=1
+    AND (:broadcaster_type IS NULL OR p.broadcaster_type = :broadcaster_type)
+    AND (:verified_only=0 OR p.broadcaster_type IN ('partner','affiliate'))
+    AND (:min_viewers IS NULL OR s.viewer_count >= :min_viewers)
+    AND (:max_viewers IS NULL OR s.viewer_count <= :max_viewers)
+    AND (:min_followers IS NULL OR (p.follower_count IS NOT NULL AND p.follower_count >= :min_followers))
+    AND (:max_followers IS NULL OR (p.follower_count IS NOT NULL AND p.follower_count <= :max_followers))
+    AND (:ignored IS NULL OR s.user_id NOT IN (SELECT value FROM json_each(:ignored)))
+) t ON t.game_id = g.id
+WHERE g.id IN (SELECT value FROM json_each(:game_ids))
+ORDER BY g.name ASC, t.viewer_count DESC
+"""
+
 
 class Database:
     def __init__(self, path: str):
@@ -14,23 +50,114 @@ class Database:
         os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
         self._init_lock = threading.Lock()
         self._initialized = False
+        self._tls = threading.local()
+        self._conns_lock = threading.Lock()
+        self._conns: list[sqlite3.Connection] = []
+        # Last-written (name, box_art_url) per game id, used to skip
+        # rewriting rows that haven't changed.
+        self._games_cache: dict[str, tuple[str, str | None]] = {}
+        self._ro_lock = threading.Lock()
+        self._ro: sqlite3.Connection | None = None
 
     def connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
         conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA journal_mode=WAL;")
         conn.execute("PRAGMA foreign_keys=ON;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute("PRAGMA temp_store=MEMORY;")
+        conn.execute("PRAGMA mmap_size=268435456;")
+        conn.execute("PRAGMA cache_size=-20000;")
+        conn.execute("PRAGMA busy_timeout=5000;")
+        return conn
+
+    def _get_ro_conn(self) -> sqlite3.Connection:
+        # A single shared read-only connection for query paths: it skips the
+        # journal/locking machinery entirely, so readers never contend with
+        # the fetcher's writes. Opened lazily because mode=ro requires the
+        # database file to exist.
+        conn = self._ro
+        if conn is None:
+            with self._ro_lock:
+                conn = self._ro
+                if conn is None:
+                    conn = sqlite3.connect(
+                        f"file:{self.path}?mode=ro",
+                        uri=True,
+                        check_same_thread=False,
+                        cached_statements=256,
+                    )
+                    conn.row_factory = sqlite3.Row
+                    conn.execute("PRAGMA query_only=1;")
+                    conn.execute("PRAGMA mmap_size=268435456;")
+                    conn.execute("PRAGMA cache_size=-20000;")
+                    conn.execute("PRAGMA busy_timeout=5000;")
+                    self._ro = conn
+        return conn
+
+    @contextmanager
+    def read_session(self) -> Iterable[sqlite3.Connection]:
+        self.init()
+        yield self._get_ro_conn()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        # One long-lived connection per thread so the page cache and parsed
+        # schema stay warm between calls.
+        conn = getattr(self._tls, "conn", None)
+        if conn is None:
+            conn = self.connect()
+            self._tls.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
         return conn
 
     @contextmanager
     def session(self) -> Iterable[sqlite3.Connection]:
         self.init()
-        conn = self.connect()
+        conn = self._get_conn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    @contextmanager
+    def transaction(self) -> Iterable[sqlite3.Connection]:
+        """Run several write methods under one commit by passing the yielded
+        connection as their ``conn`` argument."""
+        self.init()
+        conn = self._get_conn()
+        conn.execute("BEGIN IMMEDIATE")
         try:
             yield conn
             conn.commit()
-        finally:
-            conn.close()
+        except Exception:
+            conn.rollback()
+            raise
+
+    @contextmanager
+    def _maybe_session(self, conn: sqlite3.Connection | None) -> Iterable[sqlite3.Connection]:
+        # Reuse an externally managed transaction when given, otherwise open
+        # a regular session that commits on exit.
+        if conn is not None:
+            yield conn
+        else:
+            with self.session() as owned:
+                yield owned
+
+    def close_all(self) -> None:
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        with self._ro_lock:
+            if self._ro is not None:
+                conns.append(self._ro)
+                self._ro = None
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._tls = threading.local()
 
     def init(self) -> None:
         if self._initialized:
@@ -39,6 +166,9 @@ class Database:
             if self._initialized:
                 return
             with self.connect() as conn:
+                # WAL is a persistent database property, so set it once here
+                # rather than on every connect.
+                conn.execute("PRAGMA journal_mode=WAL;")
                 conn.executescript(
                     """
                     CREATE TABLE IF NOT EXISTS games (
@@ -80,14 +210,30 @@ class Database:
                     CREATE INDEX IF NOT EXISTS idx_streams_game_live ON streams(game_id, is_live);
                     CREATE INDEX IF NOT EXISTS idx_streams_last_seen ON streams(last_seen_at);
                     CREATE INDEX IF NOT EXISTS idx_profiles_follower_exp ON streamer_profiles(follower_expires_at);
+
+                    -- Covers query_streams' filter + ORDER BY viewer_count DESC
+                    -- so results come straight off an index range scan.
+                    CREATE INDEX IF NOT EXISTS idx_streams_game_live_viewers
+                      ON streams(game_id, is_live, viewer_count DESC, user_id);
+                    CREATE INDEX IF NOT EXISTS idx_profiles_bcast_followers
+                      ON streamer_profiles(broadcaster_type, follower_count);
+
+                    ANALYZE;
                     """
                 )
                 conn.commit()
             self._initialized = True
 
-    def upsert_games(self, games: list[dict[str, Any]]) -> None:
+    def upsert_games(self, games: list[dict[str, Any]], conn: sqlite3.Connection | None = None) -> None:
         now = int(time.time())
-        with self.session() as conn:
+        # Game metadata almost never changes; skip rows identical to what we
+        # last wrote so steady-state ticks don't dirty pages for nothing.
+        changed = [
+            g for g in games if self._games_cache.get(g["id"]) != (g["name"], g.get("box_art_url"))
+        ]
+        if not changed:
+            return
+        with self._maybe_session(conn) as conn:
             conn.executemany(
                 """
                 INSERT INTO games(id, name, box_art_url, updated_at)
@@ -97,8 +243,10 @@ class Database:
                   box_art_url=excluded.box_art_url,
                   updated_at=excluded.updated_at
                 """,
-                [(g["id"], g["name"], g.get("box_art_url"), now) for g in games],
+                ((g["id"], g["name"], g.get("box_art_url"), now) for g in changed),
             )
+        for g in changed:
+            self._games_cache[g["id"]] = (g["name"], g.get("box_art_url"))
 
     def touch_tracked_games(self, game_ids: list[str]) -> None:
         now = int(time.time())
@@ -109,38 +257,47 @@ class Database:
                 VALUES(?, ?)
                 ON CONFLICT(game_id) DO UPDATE SET last_requested_at=excluded.last_requested_at
                 """,
-                [(gid, now) for gid in game_ids],
+                ((gid, now) for gid in game_ids),
             )
 
     def get_tracked_games(self) -> list[str]:
         cutoff = int(time.time()) - TTL_SECONDS
-        with self.session() as conn:
+        with self.read_session() as conn:
             rows = conn.execute(
                 "SELECT game_id FROM tracked_games WHERE last_requested_at >= ? ORDER BY last_requested_at DESC",
                 (cutoff,),
             ).fetchall()
             return [r["game_id"] for r in rows]
 
-    def upsert_streams(self, game_id: str, streams: list[dict[str, Any]]) -> None:
+    def upsert_streams(
+        self, game_id: str, streams: list[dict[str, Any]], conn: sqlite3.Connection | None = None
+    ) -> None:
         now = int(time.time())
-        with self.session() as conn:
-            # mark missing live streams as inactive for this game
-            fetched_ids = {s["id"] for s in streams}
-            if fetched_ids:
-                placeholders = ",".join("?" for _ in fetched_ids)
-                conn.execute(
-                    f"""
-                    UPDATE streams
-                    SET is_live=0, ended_at=?
-                    WHERE game_id=? AND is_live=1 AND id NOT IN ({placeholders})
-                    """,
-                    (now, game_id, *sorted(fetched_ids)),
-                )
-            else:
-                conn.execute(
-                    "UPDATE streams SET is_live=0, ended_at=? WHERE game_id=? AND is_live=1",
-                    (now, game_id),
-                )
+        with self._maybe_session(conn) as conn:
+            # Single write transaction for the whole upsert; take the write
+            # lock up front so we don't upgrade mid-way.
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+
+            # Mark missing live streams as inactive for this game. A temp
+            # table keeps the SQL text constant (a dynamic IN (?,?,...) clause
+            # is recompiled for every distinct N).
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS _fetched(id TEXT PRIMARY KEY) WITHOUT ROWID")
+            conn.execute("DELETE FROM _fetched")
+            # dict.fromkeys dedupes while keeping insertion order, cheaper
+            # than a set plus sort (SQLite doesn't care about param order).
+            conn.executemany(
+                "INSERT INTO _fetched VALUES(?)",
+                ((sid,) for sid in dict.fromkeys(s["id"] for s in streams)),
+            )
+            conn.execute(
+                """
+                UPDATE streams
+                SET is_live=0, ended_at=?
+                WHERE game_id=? AND is_live=1 AND id NOT IN (SELECT id FROM _fetched)
+                """,
+                (now, game_id),
+            )
 
             conn.executemany(
                 """
@@ -161,7 +318,9 @@ class Database:
                   last_seen_at=excluded.last_seen_at,
                   ended_at=NULL
                 """,
-                [
+                # Generator: executemany iterates once, no need to build the
+                # full row list up front.
+                (
                     (
                         s["id"],
                         game_id,
@@ -175,12 +334,14 @@ class Database:
                         now,
                     )
                     for s in streams
-                ],
+                ),
             )
 
-    def upsert_streamer_profiles(self, profiles: list[dict[str, Any]]) -> None:
+    def upsert_streamer_profiles(
+        self, profiles: list[dict[str, Any]], conn: sqlite3.Connection | None = None
+    ) -> None:
         now = int(time.time())
-        with self.session() as conn:
+        with self._maybe_session(conn) as conn:
             conn.executemany(
                 """
                 INSERT INTO streamer_profiles(
@@ -193,7 +354,7 @@ class Database:
                   follower_expires_at=COALESCE(excluded.follower_expires_at, streamer_profiles.follower_expires_at),
                   updated_at=excluded.updated_at
                 """,
-                [
+                (
                     (
                         p["user_id"],
                         p.get("display_name"),
@@ -203,12 +364,12 @@ class Database:
                         now,
                     )
                     for p in profiles
-                ],
+                ),
             )
 
     def get_profiles_needing_followers(self, limit: int = 50) -> list[str]:
         now = int(time.time())
-        with self.session() as conn:
+        with self.read_session() as conn:
             rows = conn.execute(
                 """
                 SELECT user_id FROM streamer_profiles
@@ -221,6 +382,16 @@ class Database:
             ).fetchall()
             return [r["user_id"] for r in rows]
 
+    def optimize(self) -> None:
+        # Cheap planner housekeeping; only re-analyzes what SQLite thinks
+        # is stale. Called by the fetcher at the end of each tick.
+        with self.session() as conn:
+            conn.execute("PRAGMA optimize")
+
+    def analyze(self) -> None:
+        with self.session() as conn:
+            conn.execute("ANALYZE")
+
     def purge_expired(self) -> int:
         cutoff = int(time.time()) - TTL_SECONDS
         with self.session() as conn:
@@ -242,93 +413,77 @@ class Database:
 
         ignored_user_ids = ignored_user_ids or set()
 
-        where: list[str] = ["s.game_id IN ({})".format(",".join("?" for _ in game_ids))]
-        params: list[Any] = list(game_ids)
-
-        where.append("s.is_live=1")
-
-        if require_broadcaster_type in ("partner", "affiliate"):
-            where.append("p.broadcaster_type = ?")
-            params.append(require_broadcaster_type)
-        elif require_broadcaster_type == "verified":
-            where.append("p.broadcaster_type IN ('partner','affiliate')")
-
-        if min_viewers is not None:
-            where.append("s.viewer_count >= ?")
-            params.append(int(min_viewers))
-        if max_viewers is not None:
-            where.append("s.viewer_count <= ?")
-            params.append(int(max_viewers))
-
-        if min_followers is not None:
-            where.append("p.follower_count IS NOT NULL AND p.follower_count >= ?")
-            params.append(int(min_followers))
-        if max_followers is not None:
-            where.append("p.follower_count IS NOT NULL AND p.follower_count <= ?")
-            params.append(int(max_followers))
-
-        if ignored_user_ids:
-            where.append("s.user_id NOT IN ({})".format(",".join("?" for _ in ignored_user_ids)))
-            params.extend(sorted(ignored_user_ids))
-
-        sql = f"""
-        SELECT
-          g.id AS game_id, g.name AS game_name, g.box_art_url AS game_box_art_url,
-          s.id AS stream_id, s.user_id, s.user_name, s.title, s.viewer_count, s.started_at, s.language,
-          s.thumbnail_url,
-          p.broadcaster_type, p.follower_count
-        FROM streams s
-        JOIN games g ON g.id = s.game_id
-        LEFT JOIN streamer_profiles p ON p.user_id = s.user_id
-        WHERE {" AND ".join(where)}
-        ORDER BY g.name ASC, s.viewer_count DESC
-        """
+        params: dict[str, Any] = {
+            "game_ids": json.dumps(list(game_ids)),
+            "broadcaster_type": (
+                require_broadcaster_type if require_broadcaster_type in ("partner", "affiliate") else None
+            ),
+            "verified_only": 1 if require_broadcaster_type == "verified" else 0,
+            "min_viewers": int(min_viewers) if min_viewers is not None else None,
+            "max_viewers": int(max_viewers) if max_viewers is not None else None,
+            "min_followers": int(min_followers) if min_followers is not None else None,
+            "max_followers": int(max_followers) if max_followers is not None else None,
+            "ignored": json.dumps(sorted(ignored_user_ids)) if ignored_user_ids else None,
+        }
 
         games: dict[str, dict[str, Any]] = {}
-        with self.session() as conn:
-            rows = conn.execute(sql, params).fetchall()
-            for r in rows:
-                gid = r["game_id"]
-                if gid not in games:
-                    games[gid] = {
-                        "game": {
-                            "id": gid,
-                            "name": r["game_name"],
-                            "box_art_url": r["game_box_art_url"],
-                        },
-                        "streams": [],
-                    }
-                games[gid]["streams"].append(
+        with self.read_session() as conn:
+            # Plain tuple rows: sqlite3.Row name lookups are a per-field hash
+            # lookup, which adds up at thousands of rows per request.
+            cur = conn.execute(_QUERY_STREAMS_SQL, params)
+            cur.row_factory = None
+            rows = cur.fetchall()
+            # Rows arrive grouped by game (ORDER BY g.name), so resolve the
+            # game entry once per group instead of per row and bind the
+            # stream list's append to a local for the inner loop.
+            last_gid: str | None = None
+            append_stream = None
+            for (
+                gid,
+                game_name,
+                game_box_art_url,
+                stream_id,
+                user_id,
+                user_name,
+                title,
+                viewer_count,
+                started_at,
+                language,
+                thumbnail_url,
+                broadcaster_type,
+                follower_count,
+            ) in rows:
+                if gid != last_gid:
+                    entry = games.get(gid)
+                    if entry is None:
+                        games[gid] = entry = {
+                            "game": {
+                                "id": gid,
+                                "name": game_name,
+                                "box_art_url": game_box_art_url,
+                            },
+                            "streams": [],
+                        }
+                    append_stream = entry["streams"].append
+                    last_gid = gid
+                if stream_id is None:
+                    # LEFT JOIN miss: game card with no matching streams.
+                    continue
+                append_stream(
                     {
-                        "id": r["stream_id"],
-                        "user_id": r["user_id"],
-                        "user_name": r["user_name"],
-                        "title": r["title"],
-                        "viewer_count": r["viewer_count"],
-                        "started_at": r["started_at"],
-                        "language": r["language"],
-                        "thumbnail_url": r["thumbnail_url"],
-                        "broadcaster_type": r["broadcaster_type"] or "",
-                        "follower_count": r["follower_count"],
+                        "id": stream_id,
+                        "user_id": user_id,
+                        "user_name": user_name,
+                        "title": title,
+                        "viewer_count": viewer_count,
+                        "started_at": started_at,
+                        "language": language,
+                        "thumbnail_url": thumbnail_url,
+                        "broadcaster_type": broadcaster_type,
+                        "follower_count": follower_count,
                     }
                 )
 
-        # Ensure we return empty game cards too (so UI can show "no streams right now")
-        with self.session() as conn:
-            game_rows = conn.execute(
-                f"SELECT id, name, box_art_url FROM games WHERE id IN ({','.join('?' for _ in game_ids)})",
-                game_ids,
-            ).fetchall()
-            for gr in game_rows:
-                gid = gr["id"]
-                games.setdefault(
-                    gid,
-                    {
-                        "game": {"id": gid, "name": gr["name"], "box_art_url": gr["box_art_url"]},
-                        "streams": [],
-                    },
-                )
-
         # preserve followed order
         ordered = [games[gid] for gid in game_ids if gid in games]
         return {"games": ordered}
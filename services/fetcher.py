@@ -1,13 +1,18 @@
 import logging
 import threading
 import time
-from typing import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable
 
 from services.db import TTL_SECONDS, Database
 from services.twitch import TwitchClient
 
 _log = logging.getLogger(__name__)
 
+# Per-game fetches are HTTP-bound, so overlap them; bounded so we stay well
+# inside Twitch's rate budget.
+MAX_FETCH_WORKERS = 8
+
 
 class StreamFetcher:
     def __init__(
@@ -16,14 +21,14 @@ class StreamFetcher:
         twitch: TwitchClient,
         fetch_interval_seconds: int = 300,
         max_streams_per_game: int = 200,
-        languages: list[str] | None = None,
+        languages: tuple[str, ...] | None = None,
         on_game_updated: Callable[[str], None] | None = None,
     ):
         self.db = db
         self.twitch = twitch
         self.fetch_interval_seconds = max(30, int(fetch_interval_seconds))
         self.max_streams_per_game = int(max_streams_per_game)
-        self.languages = languages or []
+        self.languages = tuple(languages or ())
         self.on_game_updated = on_game_updated
 
         self._stop = threading.Event()
@@ -67,22 +72,19 @@ class StreamFetcher:
         if games:
             self.db.upsert_games(games)
 
-        for gid in game_ids:
-            if _log.isEnabledFor(logging.DEBUG):
-                _log.debug("Fetching streams for game_id=%s ...", gid)
-            streams = self.twitch.fetch_streams_for_game(
-                gid,
-                max_streams=self.max_streams_per_game,
-                languages=self.languages,
-            )
-            if _log.isEnabledFor(logging.DEBUG):
-                _log.debug("Fetched streams for game_id=%s streams=%s", gid, len(streams))
-            self.db.upsert_streams(gid, streams)
+        with ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS, thread_name_prefix="fetch") as ex:
+            # Overlap the HTTP round trips; DB writes stay on this thread so
+            # SQLite only ever sees one writer from the fetcher.
+            futures = {ex.submit(self._fetch_one, gid): gid for gid in game_ids}
+            for fut in as_completed(futures):
+                gid = futures[fut]
+                try:
+                    streams, users = fut.result()
+                except Exception:
+                    if _log.isEnabledFor(logging.DEBUG):
+                        _log.debug("Fetch failed for game_id=%s", gid, exc_info=True)
+                    continue
 
-            # Upsert streamer broadcaster types in batch
-            user_ids = list({s["user_id"] for s in streams if s.get("user_id")})
-            if user_ids:
-                users = self.twitch.get_users(user_ids)
                 # Ensure they have follower TTL slots (so we can select for refresh)
                 profiles = [
                     {
@@ -94,23 +96,27 @@ class StreamFetcher:
                     }
                     for u in users
                 ]
-                if profiles:
-                    self.db.upsert_streamer_profiles(profiles)
 
-            if self.on_game_updated:
-                self.on_game_updated(gid)
+                # One commit (fsync) per game instead of one per write method.
+                with self.db.transaction() as conn:
+                    self.db.upsert_streams(gid, streams, conn=conn)
+                    if profiles:
+                        self.db.upsert_streamer_profiles(profiles, conn=conn)
+
+                if self.on_game_updated:
+                    self.on_game_updated(gid)
 
         # Refresh follower counts for a limited batch each tick (cached for TTL_SECONDS)
         to_refresh = self.db.get_profiles_needing_followers(limit=25)
         if to_refresh:
             if _log.isEnabledFor(logging.DEBUG):
                 _log.debug("Fetching follower counts: users=%s", len(to_refresh))
+            counts_by_user = self.twitch.get_follower_counts(to_refresh)
             refreshed = []
             now = int(time.time())
             ok_count = 0
             none_count = 0
-            for uid in to_refresh:
-                cnt = self.twitch.get_follower_count(uid)
+            for uid, cnt in counts_by_user.items():
                 if cnt is None:
                     none_count += 1
                     # Retry later; don't hammer.
@@ -136,7 +142,29 @@ class StreamFetcher:
                 _log.debug("Follower counts updated: ok=%s deferred_or_unavailable=%s", ok_count, none_count)
 
         purged = self.db.purge_expired()
-        if purged and _log.isEnabledFor(logging.DEBUG):
-            _log.debug("Purged expired streams: deleted=%s", purged)
+        if purged:
+            if _log.isEnabledFor(logging.DEBUG):
+                _log.debug("Purged expired streams: deleted=%s", purged)
+            # Bulk deletes shift the table stats; refresh them so
+            # query_streams keeps its index-driven plan.
+            self.db.analyze()
+
+        self.db.optimize()
+
+    def _fetch_one(self, gid: str) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+        if _log.isEnabledFor(logging.DEBUG):
+            _log.debug("Fetching streams for game_id=%s ...", gid)
+        streams = self.twitch.fetch_streams_for_game(
+            gid,
+            max_streams=self.max_streams_per_game,
+            languages=self.languages,
+        )
+        if _log.isEnabledFor(logging.DEBUG):
+            _log.debug("Fetched streams for game_id=%s streams=%s", gid, len(streams))
+
+        # Streamer broadcaster types in batch
+        user_ids = list({s["user_id"] for s in streams if s.get("user_id")})
+        users = self.twitch.get_users(user_ids) if user_ids else []
+        return streams, users
 
 
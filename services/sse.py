@@ -1,55 +1,107 @@
-import json
+import collections
 import logging
-import queue
 import threading
 import time
 import uuid
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 _log = logging.getLogger(__name__)
 
+# Pre-baked SSE frame; only game_id and ts vary, so skip json.dumps and
+# str->bytes encoding on every publish.
+_GAME_UPDATED_TEMPLATE = b'event: game_updated\ndata: {"type":"game_updated","game_id":"%s","ts":%d}\n\n'
+_PING = b"event: ping\ndata: {}\n\n"
+
+# Keepalive cadence for the shared heartbeat thread.
+HEARTBEAT_SECONDS = 15
+
+# Per-client buffer depth, and how many consecutive overflows a client may
+# accumulate before we give up on it as a dead/stalled consumer.
+BUFFER_MAXLEN = 100
+SLOW_CLIENT_LIMIT = 10
+
 
 @dataclass
 class Client:
     id: str
     game_ids: set[str]
-    q: "queue.Queue[str]"
+    # Drop-oldest buffer: appends never block the publisher, and a stalled
+    # consumer just loses its oldest updates.
+    buf: "collections.deque[bytes]" = field(default_factory=lambda: collections.deque(maxlen=BUFFER_MAXLEN))
+    event: threading.Event = field(default_factory=threading.Event)
+    dropped: int = 0
+    closed: bool = False
 
 
 class SseHub:
     def __init__(self):
         self._lock = threading.Lock()
         self._clients: dict[str, Client] = {}
+        # Reverse index so a publish only walks the clients subscribed to
+        # that game, not every connected client.
+        self._by_game: dict[str, set[str]] = collections.defaultdict(set)
+        # One shared keepalive thread instead of a 15s timeout wakeup per
+        # connected client's generator.
+        threading.Thread(target=self._heartbeat, name="sse-heartbeat", daemon=True).start()
+
+    def _heartbeat(self) -> None:
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            with self._lock:
+                clients = list(self._clients.values())
+            for c in clients:
+                c.buf.append(_PING)
+                c.event.set()
 
     def subscribe(self, game_ids: set[str]) -> Client:
-        client = Client(id=str(uuid.uuid4()), game_ids=set(game_ids), q=queue.Queue(maxsize=100))
+        client = Client(id=str(uuid.uuid4()), game_ids=set(game_ids))
         with self._lock:
             self._clients[client.id] = client
+            for gid in client.game_ids:
+                self._by_game[gid].add(client.id)
         return client
 
     def unsubscribe(self, client_id: str) -> None:
         with self._lock:
-            self._clients.pop(client_id, None)
+            client = self._clients.pop(client_id, None)
+            if client:
+                for gid in client.game_ids:
+                    subscribers = self._by_game.get(gid)
+                    if subscribers:
+                        subscribers.discard(client_id)
+                        if not subscribers:
+                            del self._by_game[gid]
+        if client:
+            client.closed = True
+            client.event.set()  # wake the generator so it can exit
 
     def publish_game_updated(self, game_id: str) -> None:
-        payload = json.dumps({"type": "game_updated", "game_id": game_id, "ts": int(time.time())})
-        msg = f"event: game_updated\ndata: {payload}\n\n"
+        msg = _GAME_UPDATED_TEMPLATE % (game_id.encode(), int(time.time()))
 
         with self._lock:
-            clients = list(self._clients.values())
+            clients = [
+                c
+                for cid in self._by_game.get(game_id, ())
+                if (c := self._clients.get(cid)) is not None
+            ]
 
         pushed = 0
+        stalled: list[str] = []
         for c in clients:
-            if game_id not in c.game_ids:
-                continue
-            try:
-                c.q.put_nowait(msg)
-                pushed += 1
-            except queue.Full:
-                # drop updates for slow clients
-                pass
-
-        if _log.isEnabledFor(logging.DEBUG):
-            _log.debug("SSE publish: game_id=%s clients_notified=%s total_clients=%s", game_id, pushed, len(clients))
+            if len(c.buf) == BUFFER_MAXLEN:
+                c.dropped += 1
+                if c.dropped >= SLOW_CLIENT_LIMIT:
+                    stalled.append(c.id)
+                    continue
+            else:
+                c.dropped = 0
+            c.buf.append(msg)
+            c.event.set()
+            pushed += 1
 
+        for cid in stalled:
+            _log.info("SSE client %s persistently slow; disconnecting", cid)
+            self.unsubscribe(cid)
 
+        if _log.isEnabledFor(logging.DEBUG):
+            _log.debug("SSE publish: game_id=%s clients_notified=%s subscribers=%s", game_id, pushed, len(clients))
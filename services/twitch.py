@@ -1,89 +1,241 @@
+import os
 import time
 import threading
 import logging
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Any
+from urllib.parse import urlencode
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 
 _log = logging.getLogger(__name__)
 
+# Rate-limit state packs (remaining:int32, reset_at:uint32) into one int
+# so readers and writers do a single attribute load/store — atomic under the
+# GIL — instead of taking a lock per request. remaining=-1 means "unknown".
+# reset_at is on the monotonic clock so NTP skew can't distort the waits.
+_RL_UNKNOWN = -1
 
-@dataclass
+# Client-side TTL caches: game metadata is effectively static, follower
+# counts drift slowly. Capped LRU so memory stays bounded.
+GAMES_CACHE_TTL = 24 * 60 * 60
+FOLLOWERS_CACHE_TTL = 5 * 60
+CACHE_MAX_ENTRIES = 10_000
+
+
+def _pack_rl(remaining: int, reset_at: int) -> int:
+    return ((remaining & 0xFFFFFFFF) << 32) | (reset_at & 0xFFFFFFFF)
+
+
+def _unpack_rl(state: int) -> tuple[int, int]:
+    remaining = (state >> 32) & 0xFFFFFFFF
+    if remaining >= 0x80000000:
+        remaining -= 1 << 32
+    return remaining, state & 0xFFFFFFFF
+
+
+# The helix stream fields we keep; everything else in the payload is dropped.
+_STREAM_KEYS = (
+    "id",
+    "user_id",
+    "user_name",
+    "title",
+    "viewer_count",
+    "started_at",
+    "language",
+    "thumbnail_url",
+)
+
+
+def _json(resp: requests.Response) -> Any:
+    # orjson parses the raw bytes directly, skipping requests' encoding
+    # detection and the slower stdlib decoder.
+    return orjson.loads(resp.content)
+
+
+@dataclass(slots=True)
 class TwitchToken:
     access_token: str
     expires_at: float
 
 
 class TwitchClient:
-    def __init__(self, client_id: str, client_secret: str):
+    def __init__(self, client_id: str, client_secret: str, token_cache_path: str | None = None):
         self.client_id = client_id
         self.client_secret = client_secret
         self._token: TwitchToken | None = None
-        self._rl_lock = threading.Lock()
-        self._rl_reset_at: float = 0.0
-        self._rl_remaining: int | None = None
+        self._token_lock = threading.Lock()
+        self._cached_headers: dict[str, str] | None = None
+        # App tokens live ~60 days; reloading one across restarts skips the
+        # oauth2 round trip on every cold start.
+        self._token_cache_path = token_cache_path
+        if token_cache_path:
+            self._load_cached_token(token_cache_path)
+        self._rl_state = _pack_rl(_RL_UNKNOWN, 0)
+        # In-flight coalescing: concurrent callers asking for the same
+        # user/game id share one HTTP fetch instead of issuing duplicates.
+        self._inflight_lock = threading.Lock()
+        self._inflight_users: dict[str, "Future[dict[str, Any] | None]"] = {}
+        self._inflight_games: dict[str, "Future[dict[str, Any] | None]"] = {}
+        self._cache_lock = threading.Lock()
+        self._games_cache: "OrderedDict[str, tuple[float, dict[str, Any]]]" = OrderedDict()
+        self._followers_cache: "OrderedDict[str, tuple[float, int | None]]" = OrderedDict()
+        # ETag cache for the near-static metadata endpoints, keyed by full
+        # URL: a match lets helix answer 304 with no body to transfer or parse.
+        self._etag_cache: "OrderedDict[str, tuple[str, Any]]" = OrderedDict()
+        # Keep-alive session: reusing the TLS connection saves a full
+        # handshake per request, which dominates paginated helix fetches.
+        # With brotli/zstandard installed (see requirements.txt) requests
+        # advertises br/zstd too, shrinking helix JSON well below gzip.
+        self._session = requests.Session()
+        self._session.mount(
+            "https://", HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=0)
+        )
+        # One long-lived worker pool for all batched calls. Sized to the
+        # connection pool, it caps helix concurrency client-wide and avoids
+        # spinning threads up and down on every chunked or follower batch.
+        self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="twitch")
+
+    def _cache_get(self, cache: OrderedDict, key: str, ttl: float) -> Any:
+        # Returns the (ts, value) entry on a fresh hit, else None.
+        with self._cache_lock:
+            entry = cache.get(key)
+            if entry is None or time.time() - entry[0] >= ttl:
+                return None
+            cache.move_to_end(key)
+            return entry
+
+    def _cache_put(self, cache: OrderedDict, key: str, value: Any) -> None:
+        with self._cache_lock:
+            cache[key] = (time.time(), value)
+            cache.move_to_end(key)
+            while len(cache) > CACHE_MAX_ENTRIES:
+                cache.popitem(last=False)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self._session.close()
+
+    def __enter__(self) -> "TwitchClient":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _load_cached_token(self, path: str) -> None:
+        try:
+            with open(path, "rb") as f:
+                data = orjson.loads(f.read())
+            expires_at = float(data["expires_at"])
+            access_token = str(data["access_token"])
+        except (OSError, ValueError, KeyError):
+            return
+        if expires_at - 60 > time.time():
+            self._token = TwitchToken(access_token=access_token, expires_at=expires_at)
+            self._cached_headers = {
+                "Authorization": f"Bearer {access_token}",
+                "Client-Id": self.client_id,
+            }
+
+    def _save_cached_token(self, token: TwitchToken) -> None:
+        path = self._token_cache_path
+        if not path:
+            return
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(orjson.dumps({"access_token": token.access_token, "expires_at": token.expires_at}))
+            os.chmod(tmp, 0o600)
+            os.replace(tmp, path)  # atomic swap
+        except OSError:
+            _log.warning("Could not persist Twitch token cache to %s", path)
 
     def _get_token(self) -> str:
-        now = time.time()
-        if self._token and self._token.expires_at - 30 > now:
-            return self._token.access_token
+        # Lock-free fast path for a valid token.
+        token = self._token
+        if token and token.expires_at - 30 > time.time():
+            return token.access_token
 
-        resp = self._request(
-            method="POST",
-            url="https://id.twitch.tv/oauth2/token",
-            headers={"Client-Id": self.client_id},
-            params={
-                "client_id": self.client_id,
-                "client_secret": self.client_secret,
-                "grant_type": "client_credentials",
-            },
-            is_helix=False,
-        )
-        data = resp.json()
-        access_token = data["access_token"]
-        expires_in = int(data.get("expires_in", 3600))
-        self._token = TwitchToken(access_token=access_token, expires_at=now + expires_in)
-        return access_token
+        # Double-checked: concurrent workers seeing an expired token queue
+        # here and all but the first reuse the refreshed one.
+        with self._token_lock:
+            now = time.time()
+            token = self._token
+            if token and token.expires_at - 30 > now:
+                return token.access_token
+
+            resp = self._request(
+                method="POST",
+                url="https://id.twitch.tv/oauth2/token",
+                headers={"Client-Id": self.client_id},
+                params={
+                    "client_id": self.client_id,
+                    "client_secret": self.client_secret,
+                    "grant_type": "client_credentials",
+                },
+                is_helix=False,
+            )
+            data = _json(resp)
+            access_token = data["access_token"]
+            expires_in = int(data.get("expires_in", 3600))
+            self._token = TwitchToken(access_token=access_token, expires_at=now + expires_in)
+            # Build the header dict once per token; _headers() reuses it until
+            # the token is refreshed or invalidated.
+            self._cached_headers = {
+                "Authorization": f"Bearer {access_token}",
+                "Client-Id": self.client_id,
+            }
+            self._save_cached_token(self._token)
+            return access_token
 
     def _headers(self) -> dict[str, str]:
-        return {
-            "Authorization": f"Bearer {self._get_token()}",
-            "Client-Id": self.client_id,
-        }
+        token = self._token
+        headers = self._cached_headers
+        if token is not None and headers is not None and token.expires_at - 30 > time.time():
+            return headers
+        self._get_token()
+        return self._cached_headers  # type: ignore[return-value]
 
     def _update_rate_limit_from_headers(self, resp: requests.Response) -> None:
-        remaining = resp.headers.get("Ratelimit-Remaining")
-        reset = resp.headers.get("Ratelimit-Reset")
-        with self._rl_lock:
-            if remaining is not None:
-                try:
-                    self._rl_remaining = int(remaining)
-                except ValueError:
-                    pass
-            if reset is not None:
-                try:
-                    self._rl_reset_at = float(int(reset))
-                except ValueError:
-                    pass
+        remaining_hdr = resp.headers.get("Ratelimit-Remaining")
+        reset_hdr = resp.headers.get("Ratelimit-Reset")
+        if remaining_hdr is None and reset_hdr is None:
+            return
+        remaining, reset_at = _unpack_rl(self._rl_state)
+        if remaining_hdr is not None:
+            try:
+                remaining = int(remaining_hdr)
+            except ValueError:
+                pass
+        if reset_hdr is not None:
+            try:
+                # The header is wall-clock epoch seconds; rebase onto the
+                # monotonic clock once here so waiters never touch time.time().
+                reset_at = int(int(reset_hdr) - time.time() + time.monotonic())
+            except ValueError:
+                pass
+        # Single store; concurrent updaters race benignly (last writer wins).
+        self._rl_state = _pack_rl(remaining, reset_at)
 
     def _wait_if_rate_limited(self) -> None:
-        # Defer when remaining is low, until reset time.
+        # Defer when remaining is low, until reset time. The packed state
+        # only changes when a response arrives, so one snapshot and one
+        # sleep suffice; if the next request still sees a low remaining it
+        # simply defers again.
         LOW_WATERMARK = 5
-        while True:
-            with self._rl_lock:
-                remaining = self._rl_remaining
-                reset_at = self._rl_reset_at
-            now = time.time()
-            if remaining is None:
-                return
-            if remaining > LOW_WATERMARK:
-                return
-            if reset_at <= now + 0.001:
-                return
-            sleep_for = min(60.0, max(0.0, reset_at - now))
-            _log.info("Twitch rate limit low (remaining=%s); deferring for %.2fs", remaining, sleep_for)
-            time.sleep(sleep_for)
+        remaining, reset_at = _unpack_rl(self._rl_state)
+        now = time.monotonic()
+        if remaining == _RL_UNKNOWN or remaining > LOW_WATERMARK:
+            return
+        if reset_at <= now + 0.001:
+            return
+        sleep_for = min(60.0, reset_at - now)
+        _log.info("Twitch rate limit low (remaining=%s); deferring for %.2fs", remaining, sleep_for)
+        time.sleep(sleep_for)
 
     def _request(
         self,
@@ -104,13 +256,14 @@ class TwitchClient:
             if is_helix:
                 self._wait_if_rate_limited()
 
-            resp = requests.request(method, url, headers=headers, params=params, timeout=timeout)
+            resp = self._session.request(method, url, headers=headers, params=params, timeout=timeout)
             if is_helix:
                 self._update_rate_limit_from_headers(resp)
 
             # Token may have expired early; refresh and retry once.
             if is_helix and resp.status_code == 401 and attempt == 1:
                 self._token = None
+                self._cached_headers = None
                 headers = self._headers()
                 continue
 
@@ -134,51 +287,140 @@ class TwitchClient:
             resp.raise_for_status()
             return resp
 
+    def _conditional_get(self, url: str) -> Any:
+        # Conditional GET for game/category metadata, which rarely changes:
+        # send the cached ETag and reuse the already-parsed payload when
+        # helix answers 304 Not Modified. Streams are volatile, so they
+        # stay on plain GETs.
+        with self._cache_lock:
+            entry = self._etag_cache.get(url)
+        headers = self._headers()
+        if entry is not None:
+            headers = {**headers, "If-None-Match": entry[0]}
+        resp = self._request("GET", url, headers=headers)
+        if resp.status_code == 304 and entry is not None:
+            return entry[1]
+        payload = _json(resp)
+        etag = resp.headers.get("ETag")
+        if etag:
+            with self._cache_lock:
+                self._etag_cache[url] = (etag, payload)
+                self._etag_cache.move_to_end(url)
+                if len(self._etag_cache) > CACHE_MAX_ENTRIES:
+                    self._etag_cache.popitem(last=False)
+        return payload
+
     def search_games(self, query: str, first: int = 20) -> list[dict[str, Any]]:
-        resp = self._request(
-            "GET",
-            "https://api.twitch.tv/helix/search/categories",
-            headers=self._headers(),
-            params={"query": query, "first": min(max(first, 1), 100)},
+        data = self._conditional_get(
+            "https://api.twitch.tv/helix/search/categories?"
+            + urlencode({"query": query, "first": min(max(first, 1), 100)})
         )
-        data = resp.json()
-        out: list[dict[str, Any]] = []
-        for g in data.get("data", []):
-            out.append(
-                {
-                    "id": g["id"],
-                    "name": g["name"],
-                    "box_art_url": g.get("box_art_url"),
-                }
-            )
+        return [
+            {
+                "id": g["id"],
+                "name": g["name"],
+                "box_art_url": g.get("box_art_url"),
+            }
+            for g in data.get("data", [])
+        ]
+
+    def _coalesced_fetch(
+        self,
+        ids: list[str],
+        inflight: "dict[str, Future[dict[str, Any] | None]]",
+        fetch_many: "Any",
+    ) -> list[dict[str, Any]]:
+        # Claim ids nobody is fetching yet; piggyback on futures for the rest.
+        ids = list(dict.fromkeys(ids))
+        owned: dict[str, Future] = {}
+        shared: dict[str, Future] = {}
+        with self._inflight_lock:
+            for i in ids:
+                fut = inflight.get(i)
+                if fut is None:
+                    fut = Future()
+                    inflight[i] = fut
+                    owned[i] = fut
+                else:
+                    shared[i] = fut
+
+        if owned:
+            try:
+                found = fetch_many(list(owned))
+            except BaseException as e:
+                with self._inflight_lock:
+                    for i in owned:
+                        inflight.pop(i, None)
+                for fut in owned.values():
+                    fut.set_exception(e)
+                raise
+            with self._inflight_lock:
+                for i in owned:
+                    inflight.pop(i, None)
+            for i, fut in owned.items():
+                fut.set_result(found.get(i))
+
+        return [
+            record
+            for i in ids
+            if (record := (owned.get(i) or shared[i]).result()) is not None
+        ]
+
+    def _run_chunked(self, ids: list[str], fetch_chunk: Any) -> dict[str, dict[str, Any]]:
+        # Helix caps id lists at 100 per call; when several chunks are
+        # needed, overlap them on the pooled session instead of issuing
+        # serial round trips.
+        chunks = [ids[i : i + 100] for i in range(0, len(ids), 100)]
+        if len(chunks) == 1:
+            return fetch_chunk(chunks[0])
+        out: dict[str, dict[str, Any]] = {}
+        for chunk_out in self._executor.map(fetch_chunk, chunks):
+            out.update(chunk_out)
+        return out
+
+    def _fetch_games_chunk(self, chunk: list[str]) -> dict[str, dict[str, Any]]:
+        out: dict[str, dict[str, Any]] = {}
+        # Twitch ids are plain ASCII digits, so skip requests' per-call
+        # urlencode and build the repeated id= pairs ourselves.
+        payload = self._conditional_get(
+            "https://api.twitch.tv/helix/games?id=" + "&id=".join(chunk)
+        )
+        for g in payload.get("data", []):
+            record = {"id": g["id"], "name": g["name"], "box_art_url": g.get("box_art_url")}
+            out[g["id"]] = record
+            self._cache_put(self._games_cache, g["id"], record)
         return out
 
+    def _fetch_games(self, ids: list[str]) -> dict[str, dict[str, Any]]:
+        return self._run_chunked(ids, self._fetch_games_chunk)
+
     def get_games(self, ids: list[str]) -> list[dict[str, Any]]:
-        ids = [i for i in ids if i]
+        ids = list(dict.fromkeys(i for i in ids if i))
         if not ids:
             return []
-        out: list[dict[str, Any]] = []
-        for i in range(0, len(ids), 100):
-            chunk = ids[i : i + 100]
-            resp = self._request(
-                "GET",
-                "https://api.twitch.tv/helix/games",
-                headers=self._headers(),
-                params=[("id", x) for x in chunk],
-            )
-            data = resp.json().get("data", [])
-            for g in data:
-                out.append({"id": g["id"], "name": g["name"], "box_art_url": g.get("box_art_url")})
-        return out
+        hits: dict[str, dict[str, Any]] = {}
+        misses: list[str] = []
+        for i in ids:
+            entry = self._cache_get(self._games_cache, i, GAMES_CACHE_TTL)
+            if entry is not None:
+                hits[i] = entry[1]
+            else:
+                misses.append(i)
+        if misses:
+            for record in self._coalesced_fetch(misses, self._inflight_games, self._fetch_games):
+                hits[record["id"]] = record
+        return [hits[i] for i in ids if i in hits]
 
     def fetch_streams_for_game(
         self,
         game_id: str,
         max_streams: int = 200,
-        languages: list[str] | None = None,
+        languages: tuple[str, ...] | None = None,
     ) -> list[dict[str, Any]]:
-        languages = languages or []
-        collected: list[dict[str, Any]] = []
+        # Dedup as we go: language passes can overlap, and inserting into the
+        # dict up front lets us stop paginating the moment we have enough
+        # unique streams instead of over-fetching per language.
+        unique: dict[str, dict[str, Any]] = {}
 
         def fetch_page(after: str | None, language: str | None) -> tuple[list[dict[str, Any]], str | None]:
             params: list[tuple[str, str]] = [("game_id", game_id), ("first", "100")]
@@ -193,65 +435,57 @@ class TwitchClient:
                 headers=self._headers(),
                 params=params,
             )
-            payload = resp.json()
+            payload = _json(resp)
             page = payload.get("data", [])
             cursor = payload.get("pagination", {}).get("cursor")
             return page, cursor
 
         # If languages is empty => all languages in one pass
-        language_values = languages if languages else [None]
+        language_values = languages or (None,)
 
         for lang in language_values:
+            if len(unique) >= max_streams:
+                break
             after = None
-            while len(collected) < max_streams:
+            while len(unique) < max_streams:
                 page, after = fetch_page(after, lang)
-                for s in page:
-                    collected.append(
-                        {
-                            "id": s["id"],
-                            "user_id": s["user_id"],
-                            "user_name": s.get("user_name"),
-                            "title": s.get("title"),
-                            "viewer_count": s.get("viewer_count"),
-                            "started_at": s.get("started_at"),
-                            "language": s.get("language"),
-                            "thumbnail_url": s.get("thumbnail_url"),
-                        }
-                    )
-                    if len(collected) >= max_streams:
-                        break
+                # One bulk update per page instead of per-stream inserts;
+                # any overshoot past max_streams is trimmed once below.
+                unique.update(
+                    (s["id"], {k: s.get(k) for k in _STREAM_KEYS})
+                    for s in page
+                    if s["id"] not in unique
+                )
                 if not after or not page:
                     break
 
-        # de-dupe if language loops overlap
-        unique: dict[str, dict[str, Any]] = {}
-        for s in collected:
-            unique[s["id"]] = s
-        return list(unique.values())
+        out = list(unique.values())
+        return out[:max_streams] if len(out) > max_streams else out
+
+    def _fetch_users_chunk(self, chunk: list[str]) -> dict[str, dict[str, Any]]:
+        out: dict[str, dict[str, Any]] = {}
+        resp = self._request(
+            "GET",
+            "https://api.twitch.tv/helix/users?id=" + "&id=".join(chunk),
+            headers=self._headers(),
+        )
+        for u in _json(resp).get("data", []):
+            out[u["id"]] = {
+                "user_id": u["id"],
+                "display_name": u.get("display_name"),
+                # "partner", "affiliate", or ""
+                "broadcaster_type": (u.get("broadcaster_type") or ""),
+            }
+        return out
+
+    def _fetch_users(self, user_ids: list[str]) -> dict[str, dict[str, Any]]:
+        return self._run_chunked(user_ids, self._fetch_users_chunk)
 
     def get_users(self, user_ids: list[str]) -> list[dict[str, Any]]:
         user_ids = [u for u in user_ids if u]
         if not user_ids:
             return []
-        out: list[dict[str, Any]] = []
-        for i in range(0, len(user_ids), 100):
-            chunk = user_ids[i : i + 100]
-            resp = self._request(
-                "GET",
-                "https://api.twitch.tv/helix/users",
-                headers=self._headers(),
-                params=[("id", x) for x in chunk],
-            )
-            for u in resp.json().get("data", []):
-                out.append(
-                    {
-                        "user_id": u["id"],
-                        "display_name": u.get("display_name"),
-                        # "partner", "affiliate", or ""
-                        "broadcaster_type": (u.get("broadcaster_type") or ""),
-                    }
-                )
-        return out
+        return self._coalesced_fetch(user_ids, self._inflight_users, self._fetch_users)
 
     def get_follower_count(self, broadcaster_id: str) -> int | None:
         """
@@ -259,6 +493,9 @@ class TwitchClient:
         Note: Twitch has changed access requirements for follower APIs over time; if this fails
         (401/403), the app will keep follower_count as NULL and retry later.
         """
+        entry = self._cache_get(self._followers_cache, broadcaster_id, FOLLOWERS_CACHE_TTL)
+        if entry is not None:
+            return entry[1]
         resp = self._request(
             "GET",
             "https://api.twitch.tv/helix/channels/followers",
@@ -266,8 +503,28 @@ class TwitchClient:
             params={"broadcaster_id": broadcaster_id, "first": 1},
             max_attempts=3,
         )
-        if resp.status_code in (401, 403, 404):
-            return None
-        return int(resp.json().get("total", 0))
+        count = None if resp.status_code in (401, 403, 404) else int(_json(resp).get("total", 0))
+        self._cache_put(self._followers_cache, broadcaster_id, count)
+        return count
+
+    def get_follower_counts(self, user_ids: list[str]) -> dict[str, int | None]:
+        """Fetch follower counts for many users concurrently.
+
+        The followers endpoint only takes one broadcaster_id per call, so the
+        batching win is overlapping the round trips. Failures map to None so
+        one bad user doesn't sink the batch; callers retry those later.
+        """
+        user_ids = [u for u in user_ids if u]
+        if not user_ids:
+            return {}
+
+        def fetch(uid: str) -> int | None:
+            try:
+                return self.get_follower_count(uid)
+            except requests.RequestException:
+                return None
+
+        counts = list(self._executor.map(fetch, user_ids))
+        return dict(zip(user_ids, counts))
 
 
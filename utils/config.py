@@ -1,23 +1,34 @@
-import json
 import os
 from dataclasses import dataclass
 from typing import Any
 
+import orjson
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class AppConfig:
     twitch_client_id: str
     twitch_client_secret: str
     debug: bool = False
     fetch_interval_seconds: int = 300
     max_streams_per_game: int = 200
-    languages: list[str] | None = None
+    languages: tuple[str, ...] = ()
     database_path: str = "data/streamerphile.sqlite3"
 
 
+# Optional keys: (name, default, coercer). Required strings and the
+# languages list are handled separately below.
+_SCHEMA = (
+    ("debug", False, bool),
+    ("fetch_interval_seconds", 300, int),
+    ("max_streams_per_game", 200, int),
+    ("database_path", "data/streamerphile.sqlite3", str),
+)
+
+
 def _load_json(path: str) -> dict[str, Any]:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
 
 
 def load_config(config_path: str = "config.json") -> AppConfig:
@@ -27,18 +38,13 @@ def load_config(config_path: str = "config.json") -> AppConfig:
         )
 
     raw = _load_json(config_path)
-    languages = raw.get("languages", [])
-    if languages is None:
-        languages = []
+    languages = raw.get("languages") or []
 
     return AppConfig(
         twitch_client_id=raw["twitch_client_id"],
         twitch_client_secret=raw["twitch_client_secret"],
-        debug=bool(raw.get("debug", False)),
-        fetch_interval_seconds=int(raw.get("fetch_interval_seconds", 300)),
-        max_streams_per_game=int(raw.get("max_streams_per_game", 200)),
-        languages=list(languages),
-        database_path=str(raw.get("database_path", "data/streamerphile.sqlite3")),
+        languages=tuple(languages),
+        **{key: coerce(raw[key]) if key in raw else default for key, default, coerce in _SCHEMA},
     )
 
 